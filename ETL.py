@@ -160,6 +160,105 @@ df.URL = url
 df =  df[['Ip', 'Date', 'Methode', 'URL', 'Protocol', 'Status', 'Size','User-Agent']]
 df.head(3)
 
+# %% [markdown]
+# # **5.1 Sessionização dos visitantes**
+# Uma sessão é a sequência de requisições do mesmo visitante (Ip + User-Agent)
+# sem um intervalo de inatividade maior que `limite_sessao`.
+# * Ordenar por visitante e data, calcular o intervalo com `diff` e numerar as sessões com `cumsum` (sem laços em Python).
+# * Os dados são processados em lotes: as sessões ainda abertas no fim de um lote passam para o próximo,
+#   assim a memória de trabalho de cada passo fica limitada ao lote atual + sessões abertas
+#   (as sessões fechadas, já compactas, são acumuladas até o fim).
+# * Os lotes devem chegar em ordem de tempo (como no access.log); só ordenamos o `df` se não estiver.
+# * As tabelas `sessoes` e `ip_comportamento` são filtradas no Load para os mesmos IPs da tabela `log`.
+
+# %%
+limite_sessao = pd.Timedelta(minutes=30) # inatividade que fecha uma sessão
+chave_sessao = ['Ip', 'User-Agent']
+colunas_sessao = chave_sessao + ['Inicio', 'Fim', 'Paginas', 'URL_Entrada', 'URL_Saida']
+
+def sessionizar(lote, abertas, limite = limite_sessao):
+    # ---------- ordenar e calcular intervalo entre requisições ----------
+    lote = lote[chave_sessao + ['Date', 'URL']].sort_values(chave_sessao + ['Date'], kind = 'stable')
+    intervalo = lote.groupby(chave_sessao, sort = False)['Date'].diff()
+    primeira = intervalo.isna() # primeira requisição do visitante no lote
+    lote['sessao'] = (primeira | (intervalo > limite)).cumsum()
+
+    # a primeira requisição de cada visitante pode continuar a sessão aberta do lote anterior
+    fim_aberta = lote[chave_sessao].merge(abertas[chave_sessao + ['Fim']], on = chave_sessao, how = 'left')['Fim']
+    intervalo_aberta = lote['Date'] - pd.Series(fim_aberta.to_numpy(), index = lote.index)
+    lote['continua'] = primeira & (intervalo_aberta <= limite)
+
+    # ---------- agregar cada sessão ----------
+    sessoes = lote.groupby('sessao', sort = False).agg(
+        Ip          = ('Ip', 'first'),
+        User_Agent  = ('User-Agent', 'first'),
+        Inicio      = ('Date', 'min'),
+        Fim         = ('Date', 'max'),
+        Paginas     = ('URL', 'size'),
+        URL_Entrada = ('URL', 'first'),
+        URL_Saida   = ('URL', 'last'),
+        continua    = ('continua', 'first')
+    ).rename(columns = {'User_Agent': 'User-Agent'}).reset_index(drop = True)
+
+    # ---------- juntar com as sessões abertas que continuaram ----------
+    sessoes = sessoes.merge(abertas, on = chave_sessao, how = 'left', suffixes = ('', '_aberta'))
+    cont = sessoes['continua']
+    sessoes.loc[cont, 'Inicio'] = sessoes.loc[cont, 'Inicio_aberta']
+    sessoes.loc[cont, 'Paginas'] = sessoes.loc[cont, 'Paginas'] + sessoes.loc[cont, 'Paginas_aberta']
+    sessoes.loc[cont, 'URL_Entrada'] = sessoes.loc[cont, 'URL_Entrada_aberta']
+    continuadas = sessoes.loc[cont, chave_sessao]
+    sessoes = sessoes[colunas_sessao]
+
+    # sessões abertas sem novas requisições neste lote seguem como estão
+    paradas = abertas.merge(continuadas, on = chave_sessao, how = 'left', indicator = True)
+    paradas = paradas[paradas['_merge'] == 'left_only'][colunas_sessao]
+    todas = pd.concat([paradas, sessoes], ignore_index = True)
+
+    # ---------- fechar as sessões inativas ----------
+    # a última sessão de cada visitante fica aberta se ainda pode receber requisições do próximo lote
+    corte = lote['Date'].max() - limite
+    ultima = ~todas.duplicated(chave_sessao, keep = 'last')
+    aberta = ultima & (todas['Fim'] >= corte)
+    return todas[~aberta], todas[aberta].reset_index(drop = True)
+
+def sessionizar_lotes(lotes, limite = limite_sessao):
+    abertas = pd.DataFrame(columns = colunas_sessao).astype({'Inicio': 'datetime64[ns]', 'Fim': 'datetime64[ns]', 'Paginas': int})
+    fechadas = []
+    for lote in lotes:
+        if lote.empty:
+            continue
+        fechou, abertas = sessionizar(lote, abertas, limite)
+        fechadas.append(fechou)
+    fechadas.append(abertas) # no fim do arquivo todas as sessões são fechadas
+
+    sessoes = pd.concat(fechadas, ignore_index = True).sort_values(['Inicio'] + chave_sessao, ignore_index = True)
+    sessoes['Paginas'] = sessoes['Paginas'].astype(int)
+    sessoes['Duracao'] = (sessoes['Fim'] - sessoes['Inicio']).dt.total_seconds() # em segundos
+    sessoes.insert(0, 'Sessao', np.arange(1, len(sessoes) + 1))
+    return sessoes
+
+# %%
+tamanho_lote = 50000 # requisições por lote
+if not df['Date'].is_monotonic_increasing: # evita uma cópia ordenada quando o log já está em ordem
+    df = df.sort_values('Date', kind = 'stable')
+lotes = (df.iloc[i:i + tamanho_lote] for i in range(0, len(df), tamanho_lote))
+df_sessoes = sessionizar_lotes(lotes)
+df_sessoes.head()
+
+# %%
+# Comportamento por IP a partir das sessões
+df_ip_comportamento = df_sessoes.groupby('Ip').agg(
+    Sessoes           = ('Sessao', 'size'),
+    Requisicoes       = ('Paginas', 'sum'),
+    Paginas_Media     = ('Paginas', 'mean'),
+    Duracao_Media     = ('Duracao', 'mean'),
+    Duracao_Max       = ('Duracao', 'max'),
+    User_Agents       = ('User-Agent', 'nunique'),
+    Primeiro_Acesso   = ('Inicio', 'min'),
+    Ultimo_Acesso     = ('Fim', 'max')
+).reset_index()
+df_ip_comportamento.sort_values('Requisicoes', ascending = False).head()
+
 # %% [markdown]
 # # **6 - Normalizar os User-Agent**
 # **User-Agent:** São as infromacões que o cliente (navegador ou app) envia num servidor 
@@ -388,3 +487,12 @@ conn = sqlite3.connect('logServidores_web.db')
 df_final.to_sql('log', conn, if_exists = 'replace', index = False)
 
 
+
+# %%
+# sessões e comportamento por IP ao lado da tabela log, para o dashboard
+# mantendo só os IPs que ficaram no log depois da remoção dos não geolocalizados
+ips_log = df_final['Ip'].unique()
+df_sessoes = df_sessoes[df_sessoes['Ip'].isin(ips_log)]
+df_ip_comportamento = df_ip_comportamento[df_ip_comportamento['Ip'].isin(ips_log)]
+df_sessoes.to_sql('sessoes', conn, if_exists = 'replace', index = False)
+df_ip_comportamento.to_sql('ip_comportamento', conn, if_exists = 'replace', index = False)